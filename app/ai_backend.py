@@ -4,7 +4,9 @@ AI Backend for generating cover letters using OpenRouter or Gemini
 import os
 
 from google import genai
-from app.promtps import build_full_prompt
+from google.genai import types
+from app.promtps import END_MARKER, build_full_prompt, get_sampling_for_tone, get_word_target
+from app.resilience import DEPENDENCY_TIMEOUTS
 
 
 class AIBackend:
@@ -17,12 +19,16 @@ class AIBackend:
         if not self.api_key:
             raise ValueError("No AI API key found in environment variables.")
 
-        self.client = genai.Client(api_key=self.api_key)
+        # Transport-level timeout (ms) so a hung request cannot hold a worker thread forever
+        self.client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(timeout=int(DEPENDENCY_TIMEOUTS["gemini"] * 1000))
+        )
 
         # Use gemini 2.0 flash
         self.model = "gemini-2.0-flash"
 
-        # Generation config for consistent output
+        # Generation config for consistent output; max_output_tokens is derived per tone
         self.generation_config = {
             "temperature": 0.7,
             "top_p": 0.95,
@@ -30,28 +36,78 @@ class AIBackend:
             "max_output_tokens": 8192,
         }
 
-    def generate_cover_letters_with_tone(self, resume_text:str,job_description:str,tone:str = "professional") -> list[str]:
+        # Rough Gemini tokens per English word, slack for overshooting the word
+        # target, and a fixed allowance per letter for greeting, sign-off,
+        # address block and variant separator
+        self.tokens_per_word = 1.5
+        self.output_token_slack = 1.4
+        self.letter_token_overhead = 80
+        self.output_token_overhead = 64
+
+    def generation_config_for_tone(self, tone: str) -> types.GenerateContentConfig:
+        """Build the generation config for a tone, with an output budget sized to its word target"""
+        _, max_words = get_word_target(tone)
+        per_letter = max_words * self.tokens_per_word * self.output_token_slack + self.letter_token_overhead
+        budget = int(3 * per_letter) + self.output_token_overhead
+
+        config = {**self.generation_config, **get_sampling_for_tone(tone)}
+        config["max_output_tokens"] = min(budget, self.generation_config["max_output_tokens"])
+
+        return types.GenerateContentConfig(**config, stop_sequences=[END_MARKER])
+
+    def _generate(self, prompt: str, config: types.GenerateContentConfig) -> tuple[str, bool]:
+        """Call Gemini once; returns the text before the end marker and whether it was cut off"""
+        response = self.client.models.generate_content(
+            model=self.model,
+            contents=prompt,
+            config=config
+        )
+        truncated = bool(response.candidates) and (
+            response.candidates[0].finish_reason == types.FinishReason.MAX_TOKENS
+        )
+        # Extract text from response (Gemini returns object with .text)
+        return (response.text or "").split(END_MARKER)[0].strip(), truncated
+
+    @staticmethod
+    def _split_variants(content: str) -> list[str]:
+        """Split the model output into letter variants"""
+        variants = content.split("---VARIANT---")
+        variants = [v.strip() for v in variants if v.strip()]
+
+        if len(variants) < 3:
+            import re
+            variants = re.split(
+                r'\n\s*(?:Variant |Option |Letter )?[123][:.]?\s*\n',
+                content
+            )
+            variants = [v.strip() for v in variants if v.strip() and len(v) > 50]
+        return variants
+
+    def generate_cover_letters_with_tone(self, resume_text:str,job_description:str,tone:str = "professional", missing_skills:list[str] | None = None) -> list[str]:
         """Generate 3 cover letters with specified tone using Gemini API"""
 
-        prompt = build_full_prompt(tone, resume_text, job_description)
+        prompt = build_full_prompt(tone, resume_text, job_description, missing_skills)
 
         try:
-            response = self.client.models.generate_content(
-                model=self.model,
-                contents=prompt
-            )
-            # Extract text from response (Gemini returns object with .text)
-            content = response.text.strip()
-            variants = content.split("---VARIANT---")
-            variants = [v.strip() for v in variants if v.strip()]
-
-            if len(variants) < 3:
-                import re
-                variants = re.split(
-                    r'\n\s*(?:Variant |Option |Letter )?[123][:.]?\s*\n',
-                    content
+            config = self.generation_config_for_tone(tone)
+            content, truncated = self._generate(prompt, config)
+            variants = self._split_variants(content)
+
+            if truncated:
+                # The output budget cut off the last variant; never deliver a partial letter
+                variants = variants[:-1]
+                print(
+                    f"Output budget of {config.max_output_tokens} tokens hit for '{tone}' "
+                    f"after {len(variants)} complete letter(s)"
                 )
-                variants = [v.strip() for v in variants if v.strip() and len(v) > 50]
+                if len(variants) < 3:
+                    config.max_output_tokens = self.generation_config["max_output_tokens"]
+                    retry_content, retry_truncated = self._generate(prompt, config)
+                    retry_variants = self._split_variants(retry_content)
+                    if retry_truncated and len(retry_variants) > 1:
+                        retry_variants = retry_variants[:-1]
+                    if len(retry_variants) > len(variants) or not variants:
+                        content, variants = retry_content, retry_variants
 
             # Return at least one variant; ensure at most 3
             if variants and len(variants) >= 3:
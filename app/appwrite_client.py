@@ -3,7 +3,10 @@ from appwrite.query import Query
 from appwrite.services.tables_db import TablesDB
 from appwrite.services.storage import Storage
 from appwrite.id import ID
+import base64
+import json
 import os
+import zlib
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -22,6 +25,29 @@ storage = Storage(client)
 # Constants for database and collection IDs
 Databases_ID = os.getenv("APPWRITE_DATABASE_ID")
 Resumes_Collection_ID = "resumes_collection"
+Generations_Collection_ID = "generations_collection"
+Pending_Jobs_Collection_ID = "pending_jobs_collection"
+
+# Compressed text columns: prefix + base64(format version byte + payload)
+COMPRESSED_PREFIX = "cz:"
+FORMAT_ZLIB = 1
+
+
+def pack_text(text: str) -> str:
+    """Compress text for storage in a string column"""
+    blob = bytes([FORMAT_ZLIB]) + zlib.compress(text.encode("utf-8"), 9)
+    return COMPRESSED_PREFIX + base64.b64encode(blob).decode("ascii")
+
+
+def unpack_text(value: str | None) -> str | None:
+    """Decompress a stored column; values written before compression are returned as-is"""
+    if not value or not value.startswith(COMPRESSED_PREFIX):
+        return value
+    blob = base64.b64decode(value[len(COMPRESSED_PREFIX):])
+    if blob[0] == FORMAT_ZLIB:
+        return zlib.decompress(blob[1:]).decode("utf-8")
+    raise ValueError(f"Unknown compressed text format: {blob[0]}")
+
 
 # Helper functions for database operations
 def save_resume(user_id:str, resume_text:str, file_name:str):
@@ -37,14 +63,20 @@ def save_resume(user_id:str, resume_text:str, file_name:str):
         )
 
         if existing['total'] > 0:
+            row = existing['rows'][0]
+
+            # Skip the write when the stored resume is unchanged
+            if unpack_text(row.get("resume_text")) == resume_text and row.get("file_name") == file_name:
+                return row
+
             # Update existing resume
-            row_id = existing['rows'][0]['$id']
+            row_id = row['$id']
             return tables_db.update_row(
                 database_id=Databases_ID,
                 table_id=Resumes_Collection_ID,
                 row_id=row_id,
                 data={
-                    "resume_text": resume_text,
+                    "resume_text": pack_text(resume_text),
                     "file_name": file_name
                 }
             )
@@ -58,7 +90,7 @@ def save_resume(user_id:str, resume_text:str, file_name:str):
         row_id=ID.unique(),
         data={
             "user_id": user_id,
-            "resume_text": resume_text,
+            "resume_text": pack_text(resume_text),
             "file_name": file_name
         }
     )
@@ -72,7 +104,9 @@ def get_resume(user_id:str):
     )
 
     if result['total'] > 0:
-        return result['rows'][0]
+        row = result['rows'][0]
+        row['resume_text'] = unpack_text(row.get('resume_text'))
+        return row
     return None
 
 def delete_resume(user_id:str):
@@ -94,4 +128,90 @@ def delete_resume(user_id:str):
             return True
     except Exception as e:
         print(f"Error deleting resume: {e}")
-    return False
\ No newline at end of file
+    return False
+
+def save_generation(user_id:str, tone:str, model:str, prompt_hash:str, letters:list[str], latency_ms:int):
+    """Record a generation; letters are stored compressed, with a short preview for listings"""
+    return tables_db.create_row(
+        database_id=Databases_ID,
+        table_id=Generations_Collection_ID,
+        row_id=ID.unique(),
+        data={
+            "user_id": user_id,
+            "tone": tone,
+            "model": model,
+            "prompt_hash": prompt_hash,
+            "letters": pack_text(json.dumps(letters)),
+            "letter_count": len(letters),
+            "preview": letters[0][:80] if letters else "",
+            "latency_ms": latency_ms
+        }
+    )
+
+def list_generations(user_id:str, limit:int, offset:int = 0):
+    """Fetch one page of the user's generations, newest first, without the letter bodies"""
+    result = tables_db.list_rows(
+        database_id=Databases_ID,
+        table_id=Generations_Collection_ID,
+        queries=[
+            Query.equal("user_id", user_id),
+            Query.select(["$id", "$createdAt", "tone", "letter_count", "preview"]),
+            Query.order_desc("$createdAt"),
+            Query.limit(limit),
+            Query.offset(offset)
+        ]
+    )
+    return result['total'], result['rows']
+
+def get_generation(user_id:str, generation_id:str):
+    """Fetch one generation with its letters decoded, or None if it is not the user's"""
+    try:
+        row = tables_db.get_row(
+            database_id=Databases_ID,
+            table_id=Generations_Collection_ID,
+            row_id=generation_id
+        )
+    except Exception as e:
+        print(f"Error fetching generation: {e}")
+        return None
+
+    if row.get('user_id') != user_id:
+        return None
+    row['letters'] = json.loads(unpack_text(row['letters']))
+    return row
+
+def save_pending_job(kind:str, payload:dict):
+    """Persist an unfinished job so the next instance can resume it"""
+    return tables_db.create_row(
+        database_id=Databases_ID,
+        table_id=Pending_Jobs_Collection_ID,
+        row_id=ID.unique(),
+        data={
+            "kind": kind,
+            "payload": pack_text(json.dumps(payload))
+        }
+    )
+
+def list_pending_jobs(limit:int = 100):
+    """Fetch persisted jobs, oldest first, with payloads decoded"""
+    result = tables_db.list_rows(
+        database_id=Databases_ID,
+        table_id=Pending_Jobs_Collection_ID,
+        queries=[Query.order_asc("$createdAt"), Query.limit(limit)]
+    )
+    for row in result['rows']:
+        row['payload'] = json.loads(unpack_text(row['payload']))
+    return result['rows']
+
+def claim_pending_job(job_id:str) -> bool:
+    """Delete a persisted job; only the instance whose delete succeeds runs it"""
+    try:
+        tables_db.delete_row(
+            database_id=Databases_ID,
+            table_id=Pending_Jobs_Collection_ID,
+            row_id=job_id
+        )
+        return True
+    except Exception as e:
+        print(f"Pending job {job_id} already claimed: {e}")
+        return False
@@ -0,0 +1,178 @@
+"""
+Graceful drain on shutdown: finish in-flight work, persist the rest for the next instance
+"""
+import asyncio
+import logging
+import os
+from typing import Any, Awaitable, Callable
+
+from app.appwrite_client import claim_pending_job, list_pending_jobs, save_pending_job
+from app.resilience import deadline_scope
+
+logger = logging.getLogger(__name__)
+
+# How long shutdown waits for in-flight jobs before persisting them
+DRAIN_TIMEOUT = float(os.getenv("DRAIN_TIMEOUT", "20"))
+# Extra time given to handlers to tell users their job was deferred
+DRAIN_GRACE = float(os.getenv("DRAIN_GRACE", "3"))
+
+
+class JobDeferred(Exception):
+    """Raised to the caller of DrainController.run when the job was persisted for later"""
+
+
+class DrainController:
+    """Track background updates and resumable jobs so shutdown can drain them.
+
+    A job is a named unit of paid or slow work (a generation, a resume upload)
+    whose payload is enough to run it again from scratch. Job kinds are
+    registered with a coroutine function taking (bot, payload).
+
+    Webhook updates are acknowledged before they run, so an update still
+    queued behind its chat when draining starts is persisted as an "update"
+    job (its raw JSON) instead of being started late or cancelled.
+    """
+
+    def __init__(self):
+        self.accepting = True
+        self._runners: dict[str, Callable[[Any, dict], Awaitable[Any]]] = {}
+        self._updates: set[asyncio.Task] = set()
+        self._queued: dict[asyncio.Task, dict] = {}
+        self._jobs: dict[asyncio.Task, tuple[str, dict]] = {}
+        self._deferred: set[asyncio.Task] = set()
+        self.stats = {"completed_during_drain": 0, "persisted": 0, "dropped": 0, "resumed": 0}
+
+    def register(self, kind: str, runner: Callable[[Any, dict], Awaitable[Any]]):
+        """Register the coroutine function that runs (and resumes) jobs of this kind"""
+        self._runners[kind] = runner
+
+    def spawn_update(self, coroutine: Awaitable[Any], update_data: dict | None = None) -> asyncio.Task:
+        """Process an update in the background, tracked for draining.
+
+        update_data is the raw update; until the update calls begin_update it
+        counts as queued and is persisted rather than dropped by a drain.
+        """
+        task = asyncio.ensure_future(coroutine)
+        self._updates.add(task)
+        if update_data is not None:
+            self._queued[task] = update_data
+        task.add_done_callback(self._update_done)
+        return task
+
+    async def begin_update(self) -> bool:
+        """Mark the current update as started.
+
+        Returns:
+            False if the instance is draining and the update was persisted instead
+        """
+        update_data = self._queued.pop(asyncio.current_task(), None)
+        if self.accepting or update_data is None:
+            return True
+        await self._persist("update", update_data)
+        return False
+
+    def _update_done(self, task: asyncio.Task):
+        self._updates.discard(task)
+        self._queued.pop(task, None)
+        if not task.cancelled() and task.exception():
+            logger.error(f"❌ Background update failed: {task.exception()}", exc_info=task.exception())
+
+    async def run(self, kind: str, bot, payload: dict):
+        """Run a job, or persist it straight away if the instance is draining.
+
+        Raises:
+            JobDeferred: the job was handed over to the next instance
+        """
+        if not self.accepting:
+            await self._persist(kind, payload)
+            raise JobDeferred()
+
+        task = asyncio.ensure_future(self._runners[kind](bot, payload))
+        self._jobs[task] = (kind, payload)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            if task in self._deferred:
+                raise JobDeferred() from None
+            raise
+        finally:
+            self._jobs.pop(task, None)
+            self._deferred.discard(task)
+
+    async def _persist(self, kind: str, payload: dict):
+        try:
+            await asyncio.to_thread(save_pending_job, kind, payload)
+            self.stats["persisted"] += 1
+            logger.info(f"Persisted '{kind}' job for the next instance")
+        except Exception as e:
+            self.stats["dropped"] += 1
+            logger.error(f"❌ Dropped '{kind}' job, could not persist it: {e}")
+
+    async def drain(self, timeout: float = DRAIN_TIMEOUT):
+        """Stop accepting work, wait up to timeout, then persist and cancel what is left"""
+        self.accepting = False
+
+        # Updates still waiting for their chat are handed over, not started late
+        for task, update_data in list(self._queued.items()):
+            del self._queued[task]
+            task.cancel()
+            await self._persist("update", update_data)
+
+        in_flight = {task for task in self._updates if not task.done()} | set(self._jobs)
+        if not in_flight:
+            return
+
+        logger.info(f"Draining {len(self._jobs)} job(s) and {len(in_flight - set(self._jobs))} update(s)...")
+        jobs_before = set(self._jobs)
+        await asyncio.wait(in_flight, timeout=timeout)
+        self.stats["completed_during_drain"] += sum(1 for task in jobs_before if task.done())
+
+        for task, (kind, payload) in list(self._jobs.items()):
+            if task.done():
+                continue
+            self._deferred.add(task)
+            task.cancel()
+            await self._persist(kind, payload)
+
+        # Let handlers tell their users, then give up on anything still running
+        if self._updates:
+            await asyncio.wait(set(self._updates), timeout=DRAIN_GRACE)
+        for task in set(self._updates):
+            if task.done():
+                continue
+            task.cancel()
+            self.stats["dropped"] += 1
+            logger.warning("❌ Dropped an update still running after the drain grace period")
+
+        logger.info(f"🛑 Drain finished: {self.stats}")
+
+    async def resume_pending(self, bot):
+        """Claim and run jobs persisted by a previous instance"""
+        try:
+            jobs = await asyncio.to_thread(list_pending_jobs)
+        except Exception as e:
+            logger.error(f"Could not list pending jobs: {e}")
+            return
+
+        for job in jobs:
+            if job['kind'] not in self._runners:
+                logger.warning(f"Skipping pending job of unknown kind '{job['kind']}'")
+                continue
+            if not await asyncio.to_thread(claim_pending_job, job['$id']):
+                continue
+            self.stats["resumed"] += 1
+            logger.info(f"Resuming '{job['kind']}' job {job['$id']}")
+            self.spawn_update(self._resume(job['kind'], bot, job['payload']))
+
+    async def _resume(self, kind: str, bot, payload: dict):
+        try:
+            with deadline_scope():
+                await self.run(kind, bot, payload)
+        except JobDeferred:
+            pass
+        except Exception as e:
+            logger.error(f"Resumed '{kind}' job failed: {e}", exc_info=True)
+
+
+# Singleton instance
+drain = DrainController()
@@ -1,11 +1,15 @@
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Request, Response
 import os
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackQueryHandler
-from app.telegram_handlers import start, help_command, handle_document, handle_text, delete_resume, handle_tone_selection, error_handler
+from app.telegram_handlers import start, help_command, handle_document, handle_text, delete_resume, handle_tone_selection, error_handler, history_command, handle_history_selection
+from app.shared_state import MULTI_WORKER, try_become_leader
+from app.update_processor import update_processor
+from app.drain import drain
+from app.resilience import breakers
 import logging
 import threading
 
@@ -31,6 +35,12 @@ else:
     WEBHOOK_URL = os.getenv("WEBHOOK_URL")
     logger.info(f"🚀 Running in PRODUCTION mode")
 
+# Acknowledge webhook updates before processing them, so shutdown can drain them.
+# Serverless platforms (Vercel, AWS Lambda) freeze or kill work left running after
+# the response, so there each update is processed inside its request instead.
+SERVERLESS = bool(os.getenv("VERCEL") or os.getenv("AWS_LAMBDA_FUNCTION_NAME"))
+BACKGROUND_UPDATES = os.getenv("BACKGROUND_UPDATES", str(not SERVERLESS)).lower() in ("1", "true", "yes")
+
 if not BOT_TOKEN:
     raise ValueError("TELE_BOT_KEY environment variable is not set. Please check your .env file.")
 
@@ -38,20 +48,32 @@ if not WEBHOOK_URL:
     raise ValueError(f"WEBHOOK_URL is not set for {ENV} environment. Please check your .env file.")
 
 # Create the application instance
-application = Application.builder().token(BOT_TOKEN).build()
+# Updates run concurrently across chats and in order within a chat
+application = Application.builder().token(BOT_TOKEN).concurrent_updates(update_processor).build()
 
 # Register handlers immediately (for both webhook and polling)
 application.add_error_handler(error_handler)
 application.add_handler(CommandHandler("start", start))
 application.add_handler(CommandHandler("help", help_command))
 application.add_handler(CommandHandler("delete", delete_resume))
+application.add_handler(CommandHandler("history", history_command))
 application.add_handler(MessageHandler(filters.Document.PDF, handle_document))
 application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
 application.add_handler(CallbackQueryHandler(handle_tone_selection, pattern="^tone_"))
+application.add_handler(CallbackQueryHandler(handle_history_selection, pattern="^hist_"))
+
+async def replay_update(bot, update_data: dict):
+    """Process an update that a previous instance accepted but did not start"""
+    update = Update.de_json(update_data, bot)
+    await update_processor.process_update(update, application.process_update(update))
+
+drain.register("update", replay_update)
 
 # Track initialization state - use threading.Lock instead of asyncio.Lock for serverless
 _init_lock = threading.Lock()
 _is_initialized = False
+# Background processing also needs a process that outlives the request (lifespan ran)
+_lifespan_running = False
 
 
 async def ensure_application_initialized():
@@ -66,11 +88,14 @@ async def ensure_application_initialized():
                 await application.initialize()
                 await application.start()
 
-                # Set webhook if not in local mode
-                if ENV != "local":
+                # Set webhook if not in local mode; with several workers only the leader does it
+                if ENV != "local" and not try_become_leader("webhook"):
+                    logger.info("Webhook is managed by another worker")
+                elif ENV != "local":
                     try:
-                        # Delete any existing webhook first
-                        await application.bot.delete_webhook(drop_pending_updates=True)
+                        # Delete any existing webhook first. Pending updates are kept in
+                        # multi-worker mode since other workers may still be serving them.
+                        await application.bot.delete_webhook(drop_pending_updates=not MULTI_WORKER)
                         logger.info("Deleted existing webhook")
                         # Set new webhook
                         webhook_info = await application.bot.set_webhook(
@@ -97,19 +122,26 @@ async def ensure_application_initialized():
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Manage bot lifecycle: startup and shutdown"""
+    global _lifespan_running
+
     # Startup - Initialize on startup if not serverless
     logger.info("Lifespan startup triggered...")
     try:
         await ensure_application_initialized()
+        # Pick up jobs a previous instance persisted while draining
+        await drain.resume_pending(application.bot)
     except Exception as e:
         logger.error(f"Lifespan initialization failed: {e}")
         # Continue anyway - will initialize on first request
 
+    _lifespan_running = True
     yield  # App runs here
+    _lifespan_running = False
 
-    # Shutdown
+    # Shutdown: finish or persist in-flight work before stopping the bot
     logger.info("Shutting down bot...")
     try:
+        await drain.drain()
         if _is_initialized:
             await application.stop()
             await application.shutdown()
@@ -126,6 +158,10 @@ app = FastAPI(lifespan=lifespan)
 @app.post("/telegram-webhook")
 async def telegram_webhook(request: Request):
     """Handle incoming webhook updates from Telegram"""
+    # While draining, make Telegram redeliver the update to the next instance
+    if not drain.accepting:
+        return Response(status_code=503)
+
     try:
         # Ensure application is initialized (important for serverless)
         await ensure_application_initialized()
@@ -134,9 +170,20 @@ async def telegram_webhook(request: Request):
         logger.info(f"📥 Received webhook update: {data.get('update_id', 'unknown')}")
         update = Update.de_json(data, application.bot)
 
-        # Process the update
-        await application.process_update(update)
-        logger.info(f"✅ Successfully processed update: {data.get('update_id', 'unknown')}")
+        background = BACKGROUND_UPDATES and _lifespan_running
+        task = drain.spawn_update(
+            update_processor.process_update(update, application.process_update(update)),
+            update_data=data if background else None
+        )
+        if not background:
+            # No long-lived process to finish the work: respond once it is done
+            await task
+            logger.info(f"✅ Processed update: {data.get('update_id', 'unknown')}")
+            return {"ok": True}
+
+        # Acknowledge right away and process in the background, so shutdown can
+        # drain in-flight work (and persist updates still queued behind their chat)
+        logger.info(f"✅ Accepted update: {data.get('update_id', 'unknown')}")
         return {"ok": True}
     except Exception as e:
         logger.error(f"❌ Webhook error: {e}", exc_info=True)
@@ -162,7 +209,12 @@ async def health_check():
             "webhook_url": webhook_info.url,
             "pending_update_count": webhook_info.pending_update_count,
             "has_custom_certificate": webhook_info.has_custom_certificate,
-            "initialized": _is_initialized
+            "initialized": _is_initialized,
+            "multi_worker": MULTI_WORKER,
+            "background_updates": BACKGROUND_UPDATES and _lifespan_running,
+            "drain": drain.stats,
+            "circuits": {name: breaker.snapshot() for name, breaker in breakers.items()},
+            "worker_pid": os.getpid()
         }
     except Exception as e:
         logger.error(f"Health check failed: {e}", exc_info=True)
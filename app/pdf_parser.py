@@ -1,18 +1,30 @@
 # File: `app/pdf_parser.py`
 import base64
+import os
+from typing import Iterator, Union
+
 import fitz  # PyMuPDF
-from typing import Union
 
+# Extraction limits; resumes rarely need more than the first few pages
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "10")) or None
+PDF_MAX_CHARS = int(os.getenv("PDF_MAX_CHARS", "40000")) or None
+
+
+def _to_bytes(pdf_input: Union[bytes, bytearray, memoryview, str, list]) -> Union[bytes, memoryview]:
+    """Normalize input to raw PDF bytes (accepts bytes-like, base64/str, or list of lines).
 
-def _to_bytes(pdf_input: Union[bytes, str, list]) -> bytes:
-    """Normalize input to raw PDF bytes (accepts bytes, base64/str, or list of lines)."""
-    if isinstance(pdf_input, bytes):
+    Bytes-like input is returned without copying; bytearrays are wrapped in a memoryview.
+    """
+    if isinstance(pdf_input, (bytes, memoryview)):
         return pdf_input
+    if isinstance(pdf_input, bytearray):
+        return memoryview(pdf_input)
     if isinstance(pdf_input, list):
-        parts = []
-        for item in pdf_input:
-            parts.append(item if isinstance(item, bytes) else str(item).encode("latin-1"))
-        return b"".join(parts)
+        # bytes.join accepts any bytes-like item, so only str items need encoding
+        return b"".join(
+            item if isinstance(item, (bytes, bytearray, memoryview)) else str(item).encode("latin-1")
+            for item in pdf_input
+        )
     if isinstance(pdf_input, str):
         s = pdf_input.strip()
         # Try base64 decode first
@@ -27,47 +39,122 @@ def _to_bytes(pdf_input: Union[bytes, str, list]) -> bytes:
     raise TypeError("Unsupported pdf_input type")
 
 
-def _repair_eof(pdf_bytes: bytes) -> bytes:
-    """Trim anything after the last '%%EOF' or append '%%EOF' if missing."""
-    lines = pdf_bytes.splitlines(keepends=True)
-    for i in range(len(lines) - 1, -1, -1):
-        if b"%%EOF" in lines[i]:
-            return b"".join(lines[: i + 1])
+def _searchable(view: memoryview) -> Union[bytes, bytearray]:
+    """Return the object backing view for find/rfind, copying only for partial views."""
+    if isinstance(view.obj, (bytes, bytearray)) and len(view.obj) == view.nbytes:
+        return view.obj
+    return view.tobytes()
+
+
+def _repair_eof(pdf_bytes: Union[bytes, memoryview]) -> Union[bytes, memoryview]:
+    """Trim anything after the line holding the last '%%EOF' or append '%%EOF' if missing.
+
+    Trimming returns a memoryview over the input instead of a copy.
+    """
+    view = memoryview(pdf_bytes)
+    data = _searchable(view)
+
+    marker = data.rfind(b"%%EOF")
+    if marker != -1:
+        # Keep the rest of the marker's line, including its line break
+        pos = marker + len(b"%%EOF")
+        newline = data.find(b"\n", pos)
+        carriage = data.find(b"\r", pos, newline if newline != -1 else len(data))
+        if carriage != -1:
+            end = carriage + 2 if data[carriage + 1:carriage + 2] == b"\n" else carriage + 1
+        elif newline != -1:
+            end = newline + 1
+        else:
+            end = len(data)
+        return view if end == len(data) else view[:end]
+
     # no EOF found -> if looks like PDF, append EOF marker
-    if pdf_bytes.startswith(b"%PDF-"):
-        return pdf_bytes + b"\n%%EOF\n"
+    if view[:5] == b"%PDF-":
+        return b"".join((view, b"\n%%EOF\n"))
     return pdf_bytes
 
 
-def extract_text_from_pdf(pdf_input: Union[bytes, str, list]) -> str:
+def _open_document(pdf_bytes: Union[bytes, memoryview]):
+    """
+    Open a PDF, retrying with a repaired EOF if the original fails.
+
+    Returns:
+        (doc, bytes) where bytes is the stream that opened successfully
+    """
+    try:
+        return fitz.open(stream=pdf_bytes, filetype="pdf"), pdf_bytes
+    except Exception as e:
+        print(f"PDF parse attempt 'original' failed: {e}")
+
+    repaired = _repair_eof(pdf_bytes)
+    return fitz.open(stream=repaired, filetype="pdf"), repaired
+
+
+def iter_pdf_pages(pdf_input: Union[bytes, str, list], max_pages: int | None = None) -> Iterator[str]:
+    """
+    Yield the text of a PDF page by page, for consumers that can stop early.
+
+    Args:
+        pdf_input: raw bytes, base64/text string, or list of lines (bytes/str)
+        max_pages: stop after this many pages (None for all)
+
+    Yields:
+        Text of each page in document order
+    """
+    doc, _ = _open_document(_to_bytes(pdf_input))
+    try:
+        page_count = doc.page_count if max_pages is None else min(doc.page_count, max_pages)
+        for i in range(page_count):
+            yield doc[i].get_text()
+    finally:
+        doc.close()
+
+
+def extract_text_from_pdf(
+    pdf_input: Union[bytes, str, list],
+    max_pages: int | None = PDF_MAX_PAGES,
+    max_chars: int | None = PDF_MAX_CHARS,
+) -> str:
     """
     Extract text content from a PDF using PyMuPDF with repair attempts.
 
     Args:
         pdf_input: raw bytes, base64/text string, or list of lines (bytes/str)
+        max_pages: only extract the first N pages (None for all)
+        max_chars: stop once this many characters are extracted (None for no limit)
 
     Returns:
         Extracted text (empty string on failure)
     """
     pdf_bytes = _to_bytes(pdf_input)
 
-    # Try normal open first, then attempt repair if it fails.
-    for attempt in ("original", "repaired"):
-        try:
-            if attempt == "original":
-                doc = fitz.open(stream=pdf_bytes, filetype="pdf")
-            else:
-                repaired = _repair_eof(pdf_bytes)
-                doc = fitz.open(stream=repaired, filetype="pdf")
-
-            text = "".join(page.get_text() for page in doc)
-            doc.close()
-            return text.strip()
-        except Exception as e:
-            # If original failed, loop will try repaired; else fallthrough to return ""
-            print(f"PDF parse attempt '{attempt}' failed: {e}")
-
-    return ""
+    try:
+        doc, _ = _open_document(pdf_bytes)
+    except Exception as e:
+        print(f"PDF parse attempt 'repaired' failed: {e}")
+        return ""
+
+    try:
+        page_count = doc.page_count if max_pages is None else min(doc.page_count, max_pages)
+
+        chunks = []
+        extracted = 0
+        for i in range(page_count):
+            page_text = doc[i].get_text()
+            chunks.append(page_text)
+            extracted += len(page_text)
+            if max_chars is not None and extracted >= max_chars:
+                break
+
+        text = "".join(chunks)
+        if max_chars is not None:
+            text = text[:max_chars]
+        return text.strip()
+    except Exception as e:
+        print(f"PDF text extraction failed: {e}")
+        return ""
+    finally:
+        doc.close()
 
 
 def validate_pdf(pdf_input: Union[bytes, str, list]) -> tuple[bool, str]:
@@ -1,6 +1,21 @@
 """
 Cover letter prompt templates with different tones
 """
+import hashlib
+import re
+
+# Written by the model after the third variant; used as a stop sequence
+END_MARKER = "---END---"
+
+# Per-tone sampling overrides applied on top of AIBackend.generation_config
+TONE_SAMPLING = {
+    "professional": {"temperature": 0.6},
+    "concise": {"temperature": 0.5, "top_k": 30},
+    "enthusiastic": {"temperature": 0.8},
+    "creative": {"temperature": 0.95, "top_p": 0.97},
+    "technical": {"temperature": 0.5, "top_k": 30},
+    "friendly": {"temperature": 0.75},
+}
 
 TONE_PROMPTS = {
     "professional": {
@@ -152,10 +167,32 @@ def get_prompt_for_tone(tone_key: str) -> str:
     return TONE_PROMPTS[tone_key]["system_prompt"]
 
 
-def build_full_prompt(tone_key: str, resume_text: str, job_description: str) -> str:
-    """Build complete prompt with resume and JD"""
+def get_word_target(tone_key: str) -> tuple[int, int]:
+    """Get the (min, max) words per variant stated in the tone's prompt"""
+    match = re.search(r"(\d+)-(\d+) words", get_prompt_for_tone(tone_key))
+    if not match:
+        return 150, 200
+    return int(match.group(1)), int(match.group(2))
+
+
+def get_sampling_for_tone(tone_key: str) -> dict:
+    """Get sampling overrides (temperature, top_p, top_k) for selected tone"""
+    return TONE_SAMPLING.get(tone_key, TONE_SAMPLING["professional"])
+
+
+def build_full_prompt(tone_key: str, resume_text: str, job_description: str, missing_skills: list[str] | None = None) -> str:
+    """Build complete prompt with resume and JD (and JD skills the resume lacks, if known)"""
     system_prompt = get_prompt_for_tone(tone_key)
 
+    gaps = ""
+    if missing_skills:
+        gaps = f"""
+---
+
+JOB REQUIREMENTS NOT FOUND IN RESUME (do not claim these; emphasise transferable strengths instead):
+{", ".join(missing_skills)}
+"""
+
     return f"""{system_prompt}
 
 ---
@@ -167,9 +204,16 @@ RESUME:
 
 JOB DESCRIPTION:
 {job_description}
-
+{gaps}
 ---
 
 Generate exactly 3 distinct cover letter variants following the tone and style specified above.
 Ensure each variant is unique in approach while maintaining the same tone.
-Separate variants with "---VARIANT---" on its own line."""
+Separate variants with "---VARIANT---" on its own line.
+After the third variant, write "{END_MARKER}" on its own line and nothing else."""
+
+
+def prompt_hash(tone_key: str, resume_text: str, job_description: str, missing_skills: list[str] | None = None) -> str:
+    """Short stable hash of the full prompt, for recording which input produced a generation"""
+    prompt = build_full_prompt(tone_key, resume_text, job_description, missing_skills)
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,233 @@
+"""
+Deadlines, per-dependency timeouts and circuit breakers for external calls
+"""
+import asyncio
+import contextvars
+import inspect
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Total time budget for handling one update (or one resumed job)
+UPDATE_DEADLINE = float(os.getenv("UPDATE_DEADLINE", "120"))
+
+# Per-stage timeouts; each call also gets at most what is left of the update's deadline
+DEPENDENCY_TIMEOUTS = {
+    "appwrite": float(os.getenv("TIMEOUT_APPWRITE", "10")),
+    "telegram": float(os.getenv("TIMEOUT_TELEGRAM", "15")),
+    "download": float(os.getenv("TIMEOUT_DOWNLOAD", "30")),
+    "gemini": float(os.getenv("TIMEOUT_GEMINI", "60")),
+}
+
+# Threads per dependency for blocking SDK calls, so a backlog of slow Gemini
+# calls never delays Appwrite calls (and vice versa)
+DEPENDENCY_THREADS = {
+    "appwrite": int(os.getenv("THREADS_APPWRITE", "8")),
+    "telegram": 4,
+    "download": 4,
+    "gemini": int(os.getenv("THREADS_GEMINI", "16")),
+}
+
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Friendly names for fallback replies
+DEPENDENCY_NAMES = {
+    "appwrite": "Resume storage",
+    "telegram": "Telegram file service",
+    "download": "Telegram file service",
+    "gemini": "The AI service",
+}
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling the dependency while its breaker is open"""
+
+    def __init__(self, dependency: str):
+        super().__init__(f"Circuit open for {dependency}")
+        self.dependency = dependency
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the update's time budget is spent before or during a call"""
+
+    def __init__(self, dependency: str):
+        super().__init__(f"Deadline exceeded calling {dependency}")
+        self.dependency = dependency
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open single probe -> closed"""
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+
+    def allow(self) -> bool:
+        """Return True if a call may go through (claims the probe when half-open)"""
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self._probing = False
+
+        if self.state == "closed":
+            return True
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info(f"✅ Circuit for {self.name} closed")
+        self.state = "closed"
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning(f"⚠️ Circuit for {self.name} opened after {self.failures} failure(s)")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Give up a half-open probe that ended without a result (e.g. cancelled)"""
+        self._probing = False
+
+    def snapshot(self) -> dict:
+        return {"state": self.state, "failures": self.failures}
+
+
+breakers = {name: CircuitBreaker(name) for name in DEPENDENCY_TIMEOUTS}
+_executors = {
+    name: ThreadPoolExecutor(max_workers=DEPENDENCY_THREADS[name], thread_name_prefix=name)
+    for name in DEPENDENCY_TIMEOUTS
+}
+
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds: float = UPDATE_DEADLINE):
+    """Give the enclosed work (and tasks it spawns) a total time budget"""
+    token = _deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float:
+    """Seconds left in the current deadline (infinite outside a deadline scope)"""
+    deadline = _deadline.get()
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+
+def is_available(dependency: str) -> bool:
+    """Cheap check for optional work (e.g. speculation) that should not probe a broken dependency"""
+    return breakers[dependency].state == "closed"
+
+
+async def _start_in_thread(dependency: str, func, *args, **kwargs) -> asyncio.Future:
+    """Submit func to the dependency's threads and return its future once it is running.
+
+    Raises:
+        DeadlineExceeded: the update's deadline passed while the call was still queued
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def run():
+        loop.call_soon_threadsafe(started.set)
+        return func(*args, **kwargs)
+
+    future = asyncio.wrap_future(_executors[dependency].submit(run), loop=loop)
+    budget = remaining()
+    try:
+        await asyncio.wait_for(started.wait(), None if budget == float("inf") else budget)
+    except asyncio.TimeoutError:
+        future.cancel()
+        raise DeadlineExceeded(dependency) from None
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    return future
+
+
+async def guarded(dependency: str, func, *args, **kwargs):
+    """
+    Call func through the dependency's circuit breaker with a stage timeout.
+
+    Coroutine functions are awaited; plain functions run on the dependency's
+    own threads (a timed-out thread keeps running, but no longer holds the
+    caller). The stage timeout starts once the call is running, so time spent
+    queued for a thread never counts against the dependency.
+
+    Raises:
+        CircuitOpenError: the breaker is open, nothing was called
+        DeadlineExceeded: the stage timeout or update deadline ran out
+    """
+    breaker = breakers[dependency]
+    if min(DEPENDENCY_TIMEOUTS[dependency], remaining()) <= 0:
+        raise DeadlineExceeded(dependency)
+    if not breaker.allow():
+        raise CircuitOpenError(dependency)
+
+    try:
+        if inspect.iscoroutinefunction(func):
+            call = func(*args, **kwargs)
+        else:
+            call = await _start_in_thread(dependency, func, *args, **kwargs)
+    except BaseException:
+        breaker.release_probe()
+        raise
+
+    stage_timeout = DEPENDENCY_TIMEOUTS[dependency]
+    budget = remaining()
+    timeout = min(stage_timeout, budget)
+
+    try:
+        result = await asyncio.wait_for(call, timeout)
+    except asyncio.CancelledError:
+        breaker.release_probe()
+        raise
+    except asyncio.TimeoutError:
+        # Only a blown stage timeout says something about the dependency;
+        # running out of the update's budget may be earlier stages' doing
+        if stage_timeout <= budget:
+            breaker.record_failure()
+        else:
+            breaker.release_probe()
+        raise DeadlineExceeded(dependency) from None
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success()
+    return result
+
+
+def fallback_message(error: BaseException) -> str | None:
+    """User-facing reply for resilience errors, or None for other errors"""
+    if isinstance(error, CircuitOpenError):
+        return (
+            f"⚠️ {DEPENDENCY_NAMES[error.dependency]} is temporarily unavailable.\n"
+            "Please try again in a minute."
+        )
+    if isinstance(error, DeadlineExceeded):
+        return (
+            f"⏱️ {DEPENDENCY_NAMES[error.dependency]} is responding too slowly right now.\n"
+            "Please try again in a minute."
+        )
+    return None
@@ -0,0 +1,141 @@
+"""
+Cache of extracted resume text, keyed by PDF digest and Telegram file id
+"""
+import hashlib
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+from app.shared_state import MULTI_WORKER, SHARED_STATE_DB, connect
+
+
+class ResumeTextCache:
+    """Bounded LRU cache mapping PDF content to extracted text.
+
+    Entries are stored under the SHA-256 of the PDF bytes. Telegram's
+    ``file_unique_id`` is kept as an alias to the digest so a re-upload of the
+    same file can be served without downloading it again.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        self.max_entries = max(1, max_entries)
+        self._texts: OrderedDict[str, str] = OrderedDict()
+        self._aliases: dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(pdf_bytes: bytes) -> str:
+        """Return the hex SHA-256 digest used as the cache key"""
+        return hashlib.sha256(pdf_bytes).hexdigest()
+
+    def get_by_digest(self, digest: str) -> str | None:
+        """Look up extracted text by PDF digest"""
+        with self._lock:
+            text = self._texts.get(digest)
+            if text is not None:
+                self._texts.move_to_end(digest)
+            return text
+
+    def get_by_file_id(self, file_unique_id: str) -> str | None:
+        """Look up extracted text by Telegram's file_unique_id"""
+        with self._lock:
+            digest = self._aliases.get(file_unique_id)
+        if digest is None:
+            return None
+        return self.get_by_digest(digest)
+
+    def put(self, digest: str, text: str, file_unique_id: str | None = None):
+        """Store extracted text, evicting the least recently used entry if full"""
+        with self._lock:
+            self._texts[digest] = text
+            self._texts.move_to_end(digest)
+            if file_unique_id:
+                self._aliases[file_unique_id] = digest
+
+            while len(self._texts) > self.max_entries:
+                evicted, _ = self._texts.popitem(last=False)
+                self._aliases = {
+                    alias: d for alias, d in self._aliases.items() if d != evicted
+                }
+
+    def __len__(self):
+        return len(self._texts)
+
+
+class SQLiteResumeTextCache:
+    """Resume text cache shared by all workers through the shared-state SQLite database.
+
+    Same interface and LRU eviction as ResumeTextCache.
+    """
+
+    def __init__(self, max_entries: int = 128, path: str = SHARED_STATE_DB):
+        self.max_entries = max(1, max_entries)
+        self.path = path
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resume_texts ("
+                "digest TEXT PRIMARY KEY, text BLOB NOT NULL, used_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS resume_aliases ("
+                "file_unique_id TEXT PRIMARY KEY, digest TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS resume_texts_used ON resume_texts (used_at)")
+
+    digest = staticmethod(ResumeTextCache.digest)
+
+    def get_by_digest(self, digest: str) -> str | None:
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT text FROM resume_texts WHERE digest = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE resume_texts SET used_at = ? WHERE digest = ?", (time.time(), digest)
+            )
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def get_by_file_id(self, file_unique_id: str) -> str | None:
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT digest FROM resume_aliases WHERE file_unique_id = ?", (file_unique_id,)
+            ).fetchone()
+        return self.get_by_digest(row[0]) if row else None
+
+    def put(self, digest: str, text: str, file_unique_id: str | None = None):
+        with connect(self.path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO resume_texts (digest, text, used_at) VALUES (?, ?, ?)",
+                (digest, zlib.compress(text.encode("utf-8")), time.time()),
+            )
+            if file_unique_id:
+                conn.execute(
+                    "INSERT OR REPLACE INTO resume_aliases (file_unique_id, digest) VALUES (?, ?)",
+                    (file_unique_id, digest),
+                )
+            conn.execute(
+                "DELETE FROM resume_texts WHERE digest IN ("
+                "SELECT digest FROM resume_texts ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            conn.execute(
+                "DELETE FROM resume_aliases WHERE digest NOT IN (SELECT digest FROM resume_texts)"
+            )
+            conn.execute("COMMIT")
+
+    def __len__(self):
+        with connect(self.path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM resume_texts").fetchone()[0]
+
+
+# Singleton instance
+_cache_size = int(os.getenv("RESUME_CACHE_SIZE", "128"))
+resume_cache = (
+    SQLiteResumeTextCache(max_entries=_cache_size)
+    if MULTI_WORKER
+    else ResumeTextCache(max_entries=_cache_size)
+)
@@ -0,0 +1,217 @@
+"""
+Process-shared state so the bot can run under several uvicorn workers
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+
+try:
+    import fcntl
+except ImportError:  # Windows has no flock; multi-worker mode is unavailable there
+    fcntl = None
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Enable with MULTI_WORKER=true when running `uvicorn --workers N`
+MULTI_WORKER = os.getenv("MULTI_WORKER", "false").lower() in ("1", "true", "yes")
+SHARED_STATE_DIR = os.getenv(
+    "SHARED_STATE_DIR", os.path.join(tempfile.gettempdir(), "cover_letter_bot")
+)
+SHARED_STATE_DB = os.path.join(SHARED_STATE_DIR, "state.sqlite3")
+# Longest pause between attempts to take a contended chat lock file
+CHAT_LOCK_POLL_MAX = 0.05
+
+if MULTI_WORKER:
+    if fcntl is None:
+        raise RuntimeError("MULTI_WORKER requires a platform with fcntl file locks.")
+    os.makedirs(SHARED_STATE_DIR, exist_ok=True)
+
+
+@contextmanager
+def connect(path: str = SHARED_STATE_DB):
+    """Open an autocommit connection to the shared SQLite database, closing it afterwards.
+
+    An explicit transaction left open by an exception is rolled back on close.
+    """
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        yield conn
+    finally:
+        conn.close()
+
+
+# Session and cache calls get their own threads so SQLite lock waits never
+# hold the default executor that external calls run on
+_state_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="shared-state")
+
+
+async def run_state(func, *args, **kwargs):
+    """Run a (possibly blocking) session store or cache call off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_state_executor, partial(func, *args, **kwargs))
+
+
+class FileLock:
+    """Exclusive advisory lock on a file, shared between processes on the same host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = None
+
+    def acquire(self, blocking: bool = True) -> bool:
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+        try:
+            fcntl.flock(fd, flags)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+
+# Held for the lifetime of the process once acquired
+_leader_locks: dict[str, FileLock] = {}
+
+
+def try_become_leader(role: str = "webhook") -> bool:
+    """Return True if this process holds the leader lock for role.
+
+    In single-worker mode every process is the leader.
+    """
+    if not MULTI_WORKER:
+        return True
+    if role in _leader_locks:
+        return True
+
+    lock = FileLock(os.path.join(SHARED_STATE_DIR, f"leader-{role}.lock"))
+    if lock.acquire(blocking=False):
+        _leader_locks[role] = lock
+        return True
+    return False
+
+
+class MemorySessionStore:
+    """Per-process conversation state (job description, resume text) keyed by user"""
+
+    def __init__(self):
+        self._sessions: dict[str, dict] = {}
+
+    def get(self, user_id: str) -> dict:
+        return dict(self._sessions.get(user_id, {}))
+
+    def update(self, user_id: str, **values) -> dict:
+        """Merge values into the session and return the updated session"""
+        session = self._sessions.setdefault(user_id, {})
+        session.update(values)
+        return dict(session)
+
+    def clear(self, user_id: str):
+        self._sessions.pop(user_id, None)
+
+
+class SQLiteSessionStore:
+    """Conversation state stored in SQLite so every worker sees the same session"""
+
+    def __init__(self, path: str = SHARED_STATE_DB):
+        self.path = path
+        with connect(self.path) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "user_id TEXT PRIMARY KEY, data BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def get(self, user_id: str) -> dict:
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return json.loads(zlib.decompress(row[0])) if row else {}
+
+    def update(self, user_id: str, **values) -> dict:
+        with connect(self.path) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT data FROM sessions WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            data = json.loads(zlib.decompress(row[0])) if row else {}
+            data.update(values)
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, zlib.compress(json.dumps(data).encode("utf-8")), time.time()),
+            )
+            conn.execute("COMMIT")
+        return data
+
+    def clear(self, user_id: str):
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+
+class ChatLocks:
+    """Serialize update processing per chat, across processes in multi-worker mode.
+
+    Chats are hashed onto a fixed number of lock files so the lock directory
+    stays bounded; two chats sharing a stripe merely wait for each other.
+    Within a process waiters are woken in arrival order. Across processes the
+    file lock is polled, so it only guarantees one update of a chat at a time,
+    not the order in which workers get to it.
+    """
+
+    def __init__(self, cross_process: bool = MULTI_WORKER, stripes: int = 64):
+        self.cross_process = cross_process
+        self.stripes = stripes
+        self._locks: dict[int, list] = {}  # chat_id -> [asyncio.Lock, holders]
+
+    @asynccontextmanager
+    async def locked(self, chat_id: int | None):
+        if chat_id is None:
+            yield
+            return
+
+        entry = self._locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                if not self.cross_process:
+                    yield
+                    return
+
+                file_lock = FileLock(
+                    os.path.join(SHARED_STATE_DIR, f"chat-{chat_id % self.stripes}.lock")
+                )
+                # Poll instead of blocking a thread per waiter
+                delay = 0.005
+                while not file_lock.acquire(blocking=False):
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, CHAT_LOCK_POLL_MAX)
+                try:
+                    yield
+                finally:
+                    file_lock.release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(chat_id, None)
+
+
+# Singleton instances
+session_store = SQLiteSessionStore() if MULTI_WORKER else MemorySessionStore()
+chat_locks = ChatLocks()
@@ -0,0 +1,353 @@
+"""
+Local resume-JD matching: hashed n-gram vectors over resume bullets, scored with NumPy
+"""
+import hashlib
+import os
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+# Hashed feature space; rows are stored sparse, so a 100-bullet resume takes ~30 KB
+MATCH_FEATURES = 1 << 12
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "12"))
+# Resumes shorter than this (about two dense pages) are sent to the model in full
+MATCH_CONDENSE_MIN_CHARS = int(os.getenv("MATCH_CONDENSE_MIN_CHARS", "6000"))
+MATCH_INDEX_CACHE_SIZE = int(os.getenv("MATCH_INDEX_CACHE_SIZE", "256"))
+
+SECTION_HEADERS = {
+    "summary", "profile", "objective", "experience", "work experience",
+    "professional experience", "employment", "employment history", "education",
+    "skills", "technical skills", "core skills", "projects", "certifications",
+    "achievements", "awards", "publications", "languages", "interests", "volunteering",
+}
+
+# Sections kept whole when condensing; bullets elsewhere compete for the top-k slots
+KEEP_SECTIONS = {
+    "Summary", "Profile", "Objective", "Education", "Skills", "Technical Skills",
+    "Core Skills", "Certifications", "Languages",
+}
+
+STOPWORDS = {
+    "a", "about", "across", "all", "also", "an", "and", "any", "are", "as", "at",
+    "be", "been", "being", "both", "but", "by", "can", "do", "each", "etc", "for",
+    "from", "has", "have", "help", "in", "into", "is", "it", "its", "join", "looking",
+    "may", "more", "must", "new", "of", "on", "or", "our", "other", "per", "plus",
+    "role", "should", "so", "such", "team", "that", "the", "their", "them", "they",
+    "this", "to", "us", "using", "we", "well", "what", "who", "will", "with", "within",
+    "work", "working", "years", "you", "your", "ability", "strong", "experience",
+    "including", "responsibilities", "requirements", "preferred", "qualifications",
+    "knowledge", "skills", "excellent", "good", "great", "candidate", "company",
+    "opportunity", "environment", "related", "required", "etc.", "i", "my", "me",
+}
+
+# Skills named by plain words; tech spellings (c++, node.js, ci/cd) and acronyms are found by shape
+SKILL_LEXICON = {
+    "airflow", "android", "angular", "ansible", "apache", "azure", "bash", "bigquery",
+    "bootstrap", "cassandra", "clickhouse", "cloudformation", "cypress", "dart", "databricks",
+    "django", "docker", "dynamodb", "elasticsearch", "elixir", "erlang", "excel", "express",
+    "fastapi", "figma", "firebase", "flask", "flutter", "gitlab", "github", "golang",
+    "grafana", "graphql", "hadoop", "haskell", "helm", "heroku", "java", "javascript",
+    "jenkins", "jira", "jquery", "julia", "kafka", "kotlin", "kubernetes", "laravel",
+    "linux", "looker", "matlab", "mongodb", "mysql", "nestjs", "nginx", "numpy", "openai",
+    "oracle", "pandas", "perl", "photoshop", "php", "playwright", "postgres", "postgresql",
+    "powershell", "prometheus", "puppet", "pytest", "python", "pytorch", "rabbitmq",
+    "rails", "react", "redis", "redshift", "salesforce", "sass", "scala", "selenium",
+    "snowflake", "solidity", "spark", "splunk", "svelte", "tableau", "tailwind",
+    "tensorflow", "terraform", "typescript", "unity", "vue", "webpack", "ios", "macos",
+    "asp.net", "ci/cd", "devops", "mlops",
+}
+# Acronyms that count as skills when written in capitals, though they could be shouted words
+KNOWN_ACRONYMS = {
+    "ai", "ml", "nlp", "llm", "cv", "api", "rest", "grpc", "soap", "sql", "nosql", "etl",
+    "elt", "olap", "oltp", "aws", "gcp", "ecs", "eks", "gke", "aks", "iam", "vpc", "sqs",
+    "sns", "emr", "rds", "cdn", "dns", "http", "https", "tcp", "ip", "udp", "ssh", "ssl",
+    "tls", "vpn", "sso", "saml", "oauth", "ldap", "json", "xml", "yaml", "ajax", "oop",
+    "mvc", "mvvm", "spa", "pwa", "ssr", "cms", "seo", "sem", "ui", "ux", "qa", "tdd",
+    "bdd", "ddd", "sre", "ci", "cd", "iot", "erp", "crm", "sap", "sas", "spss", "vba",
+    "dax", "ssis", "ssrs", "gdpr", "hipaa", "pci", "iso", "soc", "gis", "cad", "plc",
+    "rpa", "bi", "jvm", "jwt", "wcag", "aria", "unix", "lamp", "mean", "mern",
+}
+# Skill names that are also everyday words only count with this exact spelling
+CASED_SKILLS = {"Go", "Rust", "Swift", "Spring", "Ruby"}
+# Acronyms and abbreviations in job ads that are not skills
+NOT_SKILLS = {
+    "e.g", "i.e", "and/or", "etc", "ceo", "cto", "cfo", "coo", "vp", "hr", "pto", "faq",
+    "llc", "ltd", "inc", "gmbh", "eoe", "ote", "usd", "eur", "gbp", "us", "usa", "uk",
+    "eu", "emea", "apac", "nyc", "sf", "wfh", "asap", "fte", "ft", "pt", "kpi", "kpis",
+    "okr", "okrs", "b2b", "b2c", "id", "am", "pm", "it", "ok", "remote", "hybrid", "urgent",
+}
+
+# Domains in job ad links and contact addresses, which otherwise look like node.js
+DOMAIN_SUFFIXES = {"com", "io", "org", "net", "co", "de", "uk", "ai", "dev", "app", "jobs"}
+URL_OR_EMAIL = re.compile(r"\S+@\S+|(?:https?://|www\.)\S+")
+
+BULLET_PREFIX = re.compile(r"^\s*[•●▪◦■\-–*·]\s*")
+TOKEN_PATTERN = re.compile(r"[A-Za-z][A-Za-z0-9+#.\-/]*[A-Za-z0-9+#]|[A-Za-z]")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase word tokens, keeping tech spellings like c++, c#, node.js and ci/cd"""
+    return [token.lower() for token in TOKEN_PATTERN.findall(text)]
+
+
+def _features(tokens: list[str]) -> Counter:
+    """Hashed unigram and bigram counts (crc32 keeps hashes stable across processes)"""
+    terms = [t for t in tokens if t not in STOPWORDS]
+    grams = terms + [f"{a} {b}" for a, b in zip(terms, terms[1:])]
+    return Counter(zlib.crc32(gram.encode("utf-8")) % MATCH_FEATURES for gram in grams)
+
+
+def split_resume(resume_text: str) -> tuple[list[str], list[tuple[str, str, bool]]]:
+    """
+    Split extracted resume text into a contact header and (section, line, is_bullet) entries.
+
+    PDF extraction breaks long bullets across lines, so lines that start in
+    lowercase or continue an unfinished sentence are merged into the previous entry.
+    Entries without a bullet glyph are typically role, employer or date lines.
+
+    Returns:
+        (header lines before the first section, list of (section, line, is_bullet))
+    """
+    header: list[str] = []
+    bullets: list[tuple[str, str, bool]] = []
+    section = None
+
+    for raw_line in resume_text.splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        if line.rstrip(":").lower() in SECTION_HEADERS:
+            section = line.rstrip(":").title()
+            continue
+
+        if section is None:
+            header.append(line)
+            continue
+
+        is_bullet = bool(BULLET_PREFIX.match(line))
+        line = BULLET_PREFIX.sub("", line)
+        continues = (
+            bullets
+            and not is_bullet
+            and bullets[-1][0] == section
+            and (line[:1].islower() or not bullets[-1][1].endswith((".", "!", "?", ":")))
+            and len(bullets[-1][1]) < 300
+        )
+        if continues:
+            bullets[-1] = (section, f"{bullets[-1][1]} {line}", bullets[-1][2])
+        else:
+            bullets.append((section, line, is_bullet))
+
+    return header, bullets
+
+
+class ResumeIndex:
+    """TF-IDF weighted hashed n-gram vectors over one resume's entries.
+
+    Rows are kept sparse as parallel (row, column, weight) arrays; a bullet has
+    a few dozen features out of MATCH_FEATURES, so a dense matrix would be
+    almost all zeros.
+    """
+
+    def __init__(self, resume_text: str):
+        self.header, entries = split_resume(resume_text)
+        self.sections = [section for section, _, _ in entries]
+        self.bullets = [bullet for _, bullet, _ in entries]
+        self.is_bullet = [is_bullet for _, _, is_bullet in entries]
+        self.vocabulary = set(tokenize(resume_text))
+
+        counts = [_features(tokenize(bullet)) for bullet in self.bullets]
+        sizes = [len(feature_counts) for feature_counts in counts]
+        self.rows = np.repeat(np.arange(len(counts), dtype=np.int32), sizes)
+        self.columns = np.fromiter(
+            (column for feature_counts in counts for column in feature_counts),
+            dtype=np.int32, count=sum(sizes)
+        )
+        weights = np.fromiter(
+            (count for feature_counts in counts for count in feature_counts.values()),
+            dtype=np.float32, count=sum(sizes)
+        )
+
+        # Smoothed IDF over bullets: terms repeated in every bullet carry little signal
+        document_frequency = np.bincount(self.columns, minlength=MATCH_FEATURES)
+        self.idf = (np.log((1 + len(counts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        weights = np.log1p(weights) * self.idf[self.columns]
+        norms = np.sqrt(np.bincount(self.rows, weights=weights * weights, minlength=len(counts)))
+        self.weights = (weights / np.maximum(norms, 1e-9)[self.rows]).astype(np.float32)
+
+    def score(self, job_description: str) -> np.ndarray:
+        """Cosine similarity of every bullet against the job description, in one pass"""
+        vector = np.zeros(MATCH_FEATURES, dtype=np.float32)
+        feature_counts = _features(tokenize(job_description))
+        if feature_counts:
+            columns = np.fromiter(feature_counts.keys(), dtype=np.int64)
+            vector[columns] = np.fromiter(feature_counts.values(), dtype=np.float32)
+        vector = np.log1p(vector) * self.idf
+        vector /= max(float(np.linalg.norm(vector)), 1e-9)
+        return np.bincount(
+            self.rows, weights=self.weights * vector[self.columns], minlength=len(self.bullets)
+        ).astype(np.float32)
+
+
+class MatchResult:
+    """Outcome of matching one resume against one job description"""
+
+    def __init__(self, index: ResumeIndex, scores: np.ndarray, job_description: str, top_k: int):
+        self.index = index
+        self.scores = scores
+        self.top_k = top_k
+
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        self.top_bullets = [int(i) for i in order if scores[i] > 0]
+
+        jd_terms = [t for t in tokenize(job_description) if t not in STOPWORDS and len(t) > 1]
+        self.coverage = (
+            sum(1 for t in set(jd_terms) if t in index.vocabulary) / len(set(jd_terms))
+            if jd_terms else 0.0
+        )
+        self.missing_skills = _missing_skills(job_description, index.vocabulary)
+
+    def condensed_resume(self) -> str:
+        """The resume with only its best-scoring bullets, in original order.
+
+        Headers, role/employer/date lines and KEEP_SECTIONS stay whole; bullets
+        in other sections are kept if they are among the top-k by score.
+        """
+        trimmable = [
+            i for i, (section, is_bullet) in enumerate(zip(self.index.sections, self.index.is_bullet))
+            if is_bullet and section not in KEEP_SECTIONS
+        ]
+        ranked = sorted(trimmable, key=lambda i: -self.scores[i])[:self.top_k]
+        dropped = set(trimmable) - {i for i in ranked if self.scores[i] > 0}
+
+        lines = list(self.index.header)
+        section = None
+        for i, bullet in enumerate(self.index.bullets):
+            if i in dropped:
+                continue
+            if self.index.sections[i] != section:
+                section = self.index.sections[i]
+                lines.append(f"\n{section}:")
+            lines.append(f"- {bullet}" if self.index.is_bullet[i] else bullet)
+        return "\n".join(lines)
+
+    def report(self) -> str:
+        """Plain-text match report for the chat"""
+        lines = [f"📊 Match report: {round(self.coverage * 100)}% of the job's key terms appear in your resume\n"]
+        if self.top_bullets:
+            lines.append("✅ Most relevant from your resume:")
+            lines.extend(f"• {self.index.bullets[i][:140]}" for i in self.top_bullets[:3])
+        if self.missing_skills:
+            lines.append("\n⚠️ Mentioned in the job, not in your resume:")
+            lines.append(", ".join(self.missing_skills))
+        return "\n".join(lines)
+
+
+def _looks_like_skill(token: str) -> bool:
+    """Whether a JD token (original casing) names a skill rather than an ordinary word"""
+    lowered = token.lower()
+    if lowered in SKILL_LEXICON or token in CASED_SKILLS:
+        return True
+
+    if "/" in token:
+        # ci/cd and tcp/ip, but not m/f/d, he/she or and/or
+        parts = token.split("/")
+        return token != lowered and not all(len(part) == 1 for part in parts)
+    if "." in token:
+        # node.js and vue.js, but not Ph.D, M.Sc, U.S or acme.io
+        parts = token.split(".")
+        if parts[-1].lower() in DOMAIN_SUFFIXES:
+            return False
+        return len(parts[0]) > 2 or any(c.isdigit() for c in token)
+    if "+" in token or "#" in token:
+        return True
+
+    # Acronyms only count in capitals (REST, not "the rest of the team"). Unknown
+    # all-caps words are more often shouting (HIRING, PERKS) than acronyms, so only
+    # those no English word could be spelled like count (no vowels, or digits)
+    letters = token[:-1] if len(token) > 2 and token.endswith("s") else token
+    if 2 <= len(letters) <= 6 and letters.isupper():
+        return (
+            letters.lower() in KNOWN_ACRONYMS
+            or any(c.isdigit() for c in letters)
+            or not any(c in "AEIOUY" for c in letters)
+        )
+    return False
+
+
+def _missing_skills(job_description: str, vocabulary: set[str], limit: int = 10) -> list[str]:
+    """JD skills absent from the resume: known skill names, tech spellings and acronyms.
+
+    Other capitalised words (company, city, job title, weekday), shouted
+    headings, degrees and links are never skills, since they end up in the
+    prompt as things the letter must not claim.
+
+    >>> _missing_skills(
+    ...     "WE ARE HIRING: Backend Engineer (m/f/d) in Berlin. You will build services in "
+    ...     "Python on Kubernetes and AWS, with CI/CD, Node.js and C++ tooling. A Ph.D or "
+    ...     "M.Sc is a plus. WHAT WE OFFER: competitive SALARY, great PERKS and a U.S. visa. "
+    ...     "Apply at jobs@acme.io or https://acme.io/careers (he/she/they).",
+    ...     vocabulary=set(),
+    ... )
+    ['Python', 'Kubernetes', 'AWS', 'CI/CD', 'Node.js', 'C++']
+    """
+    found = Counter()
+    spelling = {}
+    for match in TOKEN_PATTERN.finditer(URL_OR_EMAIL.sub(" ", job_description)):
+        token = match.group()
+        lowered = token.lower()
+        if lowered in STOPWORDS or lowered in vocabulary or lowered in NOT_SKILLS:
+            continue
+
+        if _looks_like_skill(token):
+            found[lowered] += 1
+            spelling.setdefault(lowered, token)
+
+    return [spelling[term] for term, _ in found.most_common(limit)]
+
+
+class ResumeIndexCache:
+    """Bounded LRU of ResumeIndex objects keyed by the SHA-256 of the resume text"""
+
+    def __init__(self, max_entries: int = MATCH_INDEX_CACHE_SIZE):
+        self.max_entries = max(1, max_entries)
+        self._indexes: OrderedDict[str, ResumeIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, resume_text: str) -> ResumeIndex:
+        """Return the index for resume_text, building it on a miss"""
+        key = hashlib.sha256(resume_text.encode("utf-8")).hexdigest()
+        with self._lock:
+            index = self._indexes.get(key)
+            if index is not None:
+                self._indexes.move_to_end(key)
+                return index
+
+        index = ResumeIndex(resume_text)
+        with self._lock:
+            self._indexes[key] = index
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+
+# Singleton instance
+resume_indexes = ResumeIndexCache()
+
+
+def match_resume(resume_text: str, job_description: str, top_k: int = MATCH_TOP_K) -> MatchResult:
+    """Score the resume's bullets against a job description"""
+    index = resume_indexes.get(resume_text)
+    return MatchResult(index, index.score(job_description), job_description, top_k)
+
+
+def prompt_resume(resume_text: str, match: MatchResult) -> str:
+    """Resume text to send to the model: condensed to the best bullets for long resumes"""
+    if len(resume_text) < MATCH_CONDENSE_MIN_CHARS or not match.top_bullets:
+        return resume_text
+    return match.condensed_resume()
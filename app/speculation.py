@@ -0,0 +1,198 @@
+"""
+Speculative cover letter generation while the user is choosing a tone
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from app.ai_backend import ai_backend
+from app.promtps import TONE_PROMPTS, prompt_hash
+from app.resilience import DeadlineExceeded, breakers, is_available, remaining
+from app.update_processor import update_processor
+
+logger = logging.getLogger(__name__)
+
+SPECULATION_ENABLED = os.getenv("SPECULATION_ENABLED", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_DEFAULT_TONE = os.getenv("SPECULATIVE_DEFAULT_TONE", "professional")
+SPECULATION_MAX_GLOBAL = int(os.getenv("SPECULATION_MAX_GLOBAL", "4"))
+SPECULATION_MAX_PER_USER = int(os.getenv("SPECULATION_MAX_PER_USER", "1"))
+# Finished speculative results are kept this long in case the user picks the tone later
+SPECULATION_TTL = int(os.getenv("SPECULATION_TTL", "600"))
+# Skip speculation when this share of update slots is already busy
+SPECULATION_LOAD_THRESHOLD = float(os.getenv("SPECULATION_LOAD_THRESHOLD", "0.5"))
+
+
+class SpeculativeGenerator:
+    """Start generating the most likely tone as soon as a job description arrives.
+
+    Speculative jobs run on their own small thread pool so they never take
+    threads from real requests, and are skipped entirely when the bot is busy
+    or the per-user / global caps are reached. The caps count work in the
+    pool, not tracked results: a superseded generation that is already running
+    cannot be stopped and keeps its user's slot until the call returns.
+    Results live in this process only; in multi-worker mode a tone picked on
+    another worker simply misses.
+    """
+
+    def __init__(
+        self,
+        max_global: int = SPECULATION_MAX_GLOBAL,
+        max_per_user: int = SPECULATION_MAX_PER_USER,
+        default_tone: str = SPECULATIVE_DEFAULT_TONE,
+        ttl: int = SPECULATION_TTL,
+    ):
+        self.max_global = max(1, max_global)
+        self.max_per_user = max(1, max_per_user)
+        self.default_tone = default_tone if default_tone in TONE_PROMPTS else "professional"
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_global, thread_name_prefix="speculation"
+        )
+        # (user_id, tone, prompt hash) -> (task, started_at); the hash covers resume, JD and gaps
+        self._jobs: dict[tuple[str, str, str], tuple[asyncio.Future, float]] = {}
+        # Submitted work per user, released when the pool finishes or drops it
+        self._in_flight: Counter[str] = Counter()
+        self._in_flight_lock = threading.Lock()
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "skipped": 0}
+
+    def predict_tone(self, last_tone: str | None) -> str:
+        """Return the tone the user picked last time, or the configured default"""
+        return last_tone if last_tone in TONE_PROMPTS else self.default_tone
+
+    def _finished(self, user_id: str, loop: asyncio.AbstractEventLoop, work):
+        # Called from pool threads (or the loop for futures cancelled while queued)
+        with self._in_flight_lock:
+            self._in_flight[user_id] -= 1
+            if self._in_flight[user_id] <= 0:
+                del self._in_flight[user_id]
+        if not work.cancelled():
+            try:
+                loop.call_soon_threadsafe(self._record_outcome, work)
+            except RuntimeError:
+                pass  # The loop already closed during shutdown
+
+    @staticmethod
+    def _record_outcome(work):
+        # Speculative calls are real Gemini calls, so they count towards its breaker
+        if work.exception() is None:
+            breakers["gemini"].record_success()
+        else:
+            breakers["gemini"].record_failure()
+
+    def _expire(self):
+        now = time.monotonic()
+        for key, (task, started_at) in list(self._jobs.items()):
+            if task.done() and now - started_at > self.ttl:
+                del self._jobs[key]
+
+    def _busy(self) -> bool:
+        # Never spend speculation on a failing or recovering AI service
+        if not is_available("gemini"):
+            return True
+        slots = update_processor.max_active_updates
+        return update_processor.active_updates >= slots * SPECULATION_LOAD_THRESHOLD
+
+    def start(
+        self,
+        user_id: str,
+        resume_text: str,
+        job_description: str,
+        missing_skills: list[str] | None = None,
+        last_tone: str | None = None,
+    ) -> str | None:
+        """Start speculative generation for the user's most likely tone.
+
+        last_tone is the tone stored in the user's session, if any.
+
+        Returns:
+            The tone being generated, or None if speculation was skipped
+        """
+        self._expire()
+
+        # A new job description or resume makes the user's earlier speculations useless
+        for key, (task, _) in list(self._jobs.items()):
+            if key[0] == user_id and key[2] != prompt_hash(key[1], resume_text, job_description, missing_skills):
+                task.cancel()
+                del self._jobs[key]
+
+        tone = self.predict_tone(last_tone)
+        key = (user_id, tone, prompt_hash(tone, resume_text, job_description, missing_skills))
+        if key in self._jobs:
+            return tone
+
+        with self._in_flight_lock:
+            running = sum(self._in_flight.values())
+            user_running = self._in_flight[user_id]
+            if running >= self.max_global or user_running >= self.max_per_user or self._busy():
+                self.stats["skipped"] += 1
+                return None
+            self._in_flight[user_id] += 1
+
+        work = self._executor.submit(
+            ai_backend.generate_cover_letters_with_tone,
+            resume_text=resume_text,
+            job_description=job_description,
+            tone=tone,
+            missing_skills=missing_skills
+        )
+        loop = asyncio.get_running_loop()
+        work.add_done_callback(lambda done: self._finished(user_id, loop, done))
+        # Cancelling the wrapper drops queued work; running calls finish in their thread
+        task = asyncio.wrap_future(work)
+        # Failures are reported when the result is taken; keep them out of the loop's log
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        self._jobs[key] = (task, time.monotonic())
+        self.stats["started"] += 1
+        logger.info(f"Speculatively generating '{tone}' letters for user {user_id}")
+        return tone
+
+    async def take(
+        self,
+        user_id: str,
+        resume_text: str,
+        job_description: str,
+        tone: str,
+        missing_skills: list[str] | None = None,
+    ) -> list[str] | None:
+        """Hand over a speculative result generated from exactly this input, if any.
+
+        Raises:
+            DeadlineExceeded: the update's deadline ran out while waiting for the result
+        """
+        key = (user_id, tone, prompt_hash(tone, resume_text, job_description, missing_skills))
+        entry = self._jobs.pop(key, None)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        budget = remaining()
+        if budget <= 0:
+            entry[0].cancel()
+            raise DeadlineExceeded("gemini")
+
+        try:
+            cover_letters = await asyncio.wait_for(entry[0], None if budget == float("inf") else budget)
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("gemini") from None
+        except asyncio.CancelledError:
+            # Only a cancelled speculation is a miss; a cancelled caller must stop here
+            current = asyncio.current_task()
+            if (current is not None and current.cancelling()) or not entry[0].cancelled():
+                raise
+            self.stats["misses"] += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Speculative generation failed, regenerating: {e}")
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return cover_letters
+
+
+# Singleton instance
+speculator = SpeculativeGenerator()
@@ -1,21 +1,36 @@
 """
 Telegram bot handlers for processing user messages and commands
 """
+import asyncio
 import httpx
 import telegram
 from telegram import Update, InlineKeyboardButton
+from telegram.error import BadRequest
 from telegram.ext import ContextTypes
 import logging
-from app.appwrite_client import save_resume, get_resume
+import time
+from app.appwrite_client import save_resume, get_resume, save_generation, list_generations, get_generation
 from app.pdf_parser import extract_text_from_pdf, validate_pdf
+from app.resume_cache import resume_cache
+from app.shared_state import run_state, session_store
+from app.skill_matcher import match_resume, prompt_resume, resume_indexes
 from app.ai_backend import ai_backend
+from app.speculation import SPECULATION_ENABLED, speculator
+from app.drain import JobDeferred, drain
+from app.resilience import DEPENDENCY_TIMEOUTS, fallback_message, guarded
 import os
 from dotenv import load_dotenv
 
-from app.promtps import get_tone_options
+from app.promtps import get_tone_options, prompt_hash
 
 load_dotenv()
 BOT_TOKEN = os.getenv("TELE_BOT_KEY")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "5"))
+
+RESTARTING_MESSAGE = (
+    "⏳ The bot is restarting for an update.\n"
+    "Your request is saved and will be finished as soon as it is back."
+)
 
 #Conversation tones
 WAITING_FOR_JD = 1
@@ -36,7 +51,7 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     # Optionally send error message to user
     if update and update.effective_message:
         await update.effective_message.reply_text(
-            "⚠️ An error occurred. Please try again."
+            fallback_message(context.error) or "⚠️ An error occurred. Please try again."
         )
 
 async def start(update: Update, _context: ContextTypes.DEFAULT_TYPE):
@@ -57,6 +72,7 @@ async def start(update: Update, _context: ContextTypes.DEFAULT_TYPE):
         "Commands:\n"
         "/start - Start over\n"
         "/help - Show this message\n"
+        "/history - Show your past cover letters\n"
         "/delete - Delete saved resume"
     )
 
@@ -69,7 +85,8 @@ async def help_command(update: Update, _context: ContextTypes.DEFAULT_TYPE):
         "3. You can optionally provide a job description for a tailored cover letter\n\n"
         "Commands:\n"
         "/start - Start the bot\n"
-        "/help - Show this help message"
+        "/help - Show this help message\n"
+        "/history - Show your past cover letters"
     )
 
 async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -95,49 +112,85 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("📄 Processing your resume... Please wait.")
 
     try:
-        # Download the file (Temporary)
-        file = await context.bot.get_file(document.file_id)
-        async with httpx.AsyncClient() as http_client:
-            response = await http_client.get(
-                f"{file.file_path}"
-            )
-            pdf_bytes = response.content
-        # file_bytes = bytearray(pdf_bytes)
+        await drain.run("upload", context.bot, {
+            "user_id": user_id,
+            "chat_id": update.effective_chat.id,
+            "file_id": document.file_id,
+            "file_unique_id": document.file_unique_id,
+            "file_name": document.file_name
+        })
+    except JobDeferred:
+        await update.message.reply_text(RESTARTING_MESSAGE)
+
+async def process_resume_upload(bot, job: dict):
+    """Download, parse and save an uploaded resume (runs as a resumable job)"""
+    chat_id = job["chat_id"]
 
-        is_valid, error_msg = validate_pdf(pdf_bytes)
+    try:
+        # Re-uploads of a known file skip the download entirely
+        resume_text = await run_state(resume_cache.get_by_file_id, job["file_unique_id"])
+
+        if resume_text is None:
+            # Download the file (Temporary)
+            file = await guarded("telegram", bot.get_file, job["file_id"])
+            async with httpx.AsyncClient(timeout=DEPENDENCY_TIMEOUTS["download"]) as http_client:
+                response = await guarded(
+                    "download",
+                    http_client.get,
+                    f"{file.file_path}"
+                )
+                pdf_bytes = response.content
+            # file_bytes = bytearray(pdf_bytes)
 
-        # Validate PDF
-        if not is_valid:
-            await update.message.reply_text(f"Invalid PDF file: {error_msg}\nPlease send a valid resume PDF.")
-            return
+            # Same bytes uploaded as a different file skip PyMuPDF
+            digest = resume_cache.digest(pdf_bytes)
+            resume_text = await run_state(resume_cache.get_by_digest, digest)
 
-        # Extract text from PDF
-        resume_text = extract_text_from_pdf(pdf_bytes)
+            if resume_text is None:
+                is_valid, error_msg = await asyncio.to_thread(validate_pdf, pdf_bytes)
 
-        if not resume_text:
-            await update.message.reply_text(
-                "⚠️ Could not extract much text from the PDF.\n"
-                "Could not extract text from the PDF. Please make sure it's not a scanned image."
-            )
-            return
+                # Validate PDF
+                if not is_valid:
+                    await bot.send_message(chat_id=chat_id, text=f"Invalid PDF file: {error_msg}\nPlease send a valid resume PDF.")
+                    return
+
+                # Extract text from PDF
+                resume_text = await asyncio.to_thread(extract_text_from_pdf, pdf_bytes)
+
+                if not resume_text:
+                    await bot.send_message(
+                        chat_id=chat_id,
+                        text="⚠️ Could not extract much text from the PDF.\n"
+                        "Could not extract text from the PDF. Please make sure it's not a scanned image."
+                    )
+                    return
+
+            await run_state(resume_cache.put, digest, resume_text, file_unique_id=job["file_unique_id"])
+
+        # Build the matching index now so the first JD is scored instantly
+        resume_indexes.get(resume_text)
 
         # Step 3: Save only the text to database (PDF is discarded)
-        save_resume(
-            user_id=user_id,
+        await guarded(
+            "appwrite",
+            save_resume,
+            user_id=job["user_id"],
             resume_text=resume_text,
-            file_name=document.file_name
+            file_name=job["file_name"]
         )
 
-        await update.message.reply_text(
-            f"✅ Resume processed successfully!\n\n"
-            f"📄 File: {document.file_name}\n"
+        await bot.send_message(
+            chat_id=chat_id,
+            text=f"✅ Resume processed successfully!\n\n"
+            f"📄 File: {job['file_name']}\n"
             f"📏 Extracted: {len(resume_text)} characters\n"
             f"💾 Saved as text only (PDF discarded)\n\n"
             f"Now send me a job description to generate cover letters!"
         )
     except Exception as e:
-        await update.message.reply_text(
-            "❌ An error occurred while processing your resume. Please try again."
+        await bot.send_message(
+            chat_id=chat_id,
+            text=fallback_message(e) or "❌ An error occurred while processing your resume. Please try again."
         )
         print(f"Error processing document: {e}")
 
@@ -177,7 +230,7 @@ async def handle_text(update: Update, _context: ContextTypes.DEFAULT_TYPE):
     jd_text = update.message.text
 
     # Check if user has resume
-    resume_data = get_resume(user_id)
+    resume_data = await guarded("appwrite", get_resume, user_id)
     if not resume_data:
         await update.message.reply_text(
             "❌ Please upload your resume first!\n"
@@ -185,26 +238,49 @@ async def handle_text(update: Update, _context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    # Save job description in context for later use
-    _context.user_data['job_description'] = jd_text
-    _context.user_data['resume_data'] = resume_data
+    # Match resume bullets against the JD locally (no model call)
+    match = match_resume(resume_data['resume_text'], jd_text)
+    resume_text = prompt_resume(resume_data['resume_text'], match)
+    await update.message.reply_text(match.report())
+
+    # Save job description in the (possibly shared) session for later use
+    session = await run_state(
+        session_store.update,
+        user_id,
+        job_description=jd_text,
+        resume_text=resume_text,
+        missing_skills=match.missing_skills
+    )
+
+    # Start on the most likely tone while the user is still choosing
+    if SPECULATION_ENABLED:
+        speculator.start(user_id, resume_text, jd_text, match.missing_skills, last_tone=session.get("last_tone"))
 
     # show tone selection buttons
     await show_tone_selection(update, _context)
 
+async def _answer_query(query):
+    """Acknowledge a button press; one replayed after a restart may be too old to answer"""
+    try:
+        await query.answer()
+    except BadRequest as e:
+        print(f"Could not answer callback query, continuing: {e}")
+
 async def handle_tone_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle tone selection callback"""
     query = update.callback_query
-    await query.answer()
+    await _answer_query(query)
 
     # Extract tone key from callback data
     tone_key = query.data.replace("tone_", "")
 
     # Get saved data
-    job_description = context.user_data.get("job_description")
-    resume_data = context.user_data.get("resume_data")
+    user_id = str(update.effective_user.id)
+    session = await run_state(session_store.get, user_id)
+    job_description = session.get("job_description")
+    resume_text = session.get("resume_text")
 
-    if not job_description or not resume_data:
+    if not job_description or not resume_text:
         await query.edit_message_text("❌ Session expired. Please upload resume and JD again.")
         return
 
@@ -214,38 +290,93 @@ async def handle_tone_selection(update: Update, context: ContextTypes.DEFAULT_TY
         f"This may take 15-30 seconds."
     )
 
+    # Remember the choice so the next speculation picks the same tone
+    await run_state(session_store.update, user_id, last_tone=tone_key)
+
     try:
+        await drain.run("generation", context.bot, {
+            "user_id": user_id,
+            "chat_id": update.effective_chat.id,
+            "tone": tone_key,
+            "job_description": job_description,
+            "resume_text": resume_text,
+            "missing_skills": session.get("missing_skills")
+        })
+    except JobDeferred:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text=RESTARTING_MESSAGE)
+
+async def deliver_cover_letters(bot, job: dict):
+    """Generate cover letters and send them to the chat (runs as a resumable job)"""
+    chat_id = job["chat_id"]
+    tone_key = job["tone"]
+
+    try:
+        started = time.monotonic()
+
+        # Use the speculative result if it was started for this tone
+        cover_letters = None
+        if SPECULATION_ENABLED:
+            cover_letters = await speculator.take(
+                job["user_id"],
+                job["resume_text"],
+                job["job_description"],
+                tone_key,
+                job["missing_skills"]
+            )
+
         # Generate cover letters
-        cover_letters = ai_backend.generate_cover_letters_with_tone(
-            resume_text=resume_data['resume_text'],
-            job_description=job_description,
-            tone=tone_key
-        )
+        if cover_letters is None:
+            cover_letters = await guarded(
+                "gemini",
+                ai_backend.generate_cover_letters_with_tone,
+                resume_text=job["resume_text"],
+                job_description=job["job_description"],
+                tone=tone_key,
+                missing_skills=job["missing_skills"]
+            )
+
+        latency_ms = int((time.monotonic() - started) * 1000)
 
         # Send each cover letter
         for i, letter in enumerate(cover_letters, start=1):
-            await context.bot.send_message(
-                chat_id= update.effective_chat.id,
+            await bot.send_message(
+                chat_id=chat_id,
                 text=f"📝 **Cover Letter Variant {i}/{len(cover_letters)}**\n\n{letter}\n\n{'─' * 40}"
             )
 
         # Send completion message
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
+        await bot.send_message(
+            chat_id=chat_id,
             text=(
                 f"✅ **Done!** Generated {len(cover_letters)} cover letters.\n\n"
                 "💡 **Tips:**\n"
                 "• Customize with specific company details\n"
                 "• Add personal touches\n"
                 "• Proofread before sending\n\n"
-                "Want to try a different tone? Send the job description again!"
+                "Want to try a different tone? Send the job description again!\n"
+                "Use /history to see these letters again later."
             )
         )
 
+        # Record the generation so it can be shown again without a model call
+        try:
+            await guarded(
+                "appwrite",
+                save_generation,
+                user_id=job["user_id"],
+                tone=tone_key,
+                model=ai_backend.model,
+                prompt_hash=prompt_hash(tone_key, job["resume_text"], job["job_description"], job["missing_skills"]),
+                letters=cover_letters,
+                latency_ms=latency_ms
+            )
+        except Exception as e:
+            print(f"Error saving generation history: {e}")
+
     except Exception as e:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text="❌ Error generating cover letters. Please try again."
+        await bot.send_message(
+            chat_id=chat_id,
+            text=fallback_message(e) or "❌ Error generating cover letters. Please try again."
         )
         print(f"Error: {e}")
 
@@ -254,7 +385,8 @@ async def delete_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from app.appwrite_client import delete_resume as delete_user_resume
 
     user_id = str(update.effective_user.id)
-    success = delete_user_resume(user_id)
+    success = await guarded("appwrite", delete_user_resume, user_id)
+    await run_state(session_store.clear, user_id)
 
     if success:
         await update.message.reply_text(
@@ -262,4 +394,72 @@ async def delete_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "Upload a new one to start over."
         )
     else:
-        await update.message.reply_text("ℹ️ No resume found to delete.")
\ No newline at end of file
+        await update.message.reply_text("ℹ️ No resume found to delete.")
+
+async def history_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show the first page of the user's generation history"""
+    text, reply_markup = await _history_page(str(update.effective_user.id), page=0)
+    await update.message.reply_text(text, reply_markup=reply_markup)
+
+async def handle_history_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle history paging and opening a past generation"""
+    query = update.callback_query
+    await _answer_query(query)
+    user_id = str(update.effective_user.id)
+
+    if query.data.startswith("hist_page_"):
+        page = int(query.data.replace("hist_page_", ""))
+        text, reply_markup = await _history_page(user_id, page)
+        await query.edit_message_text(text, reply_markup=reply_markup)
+        return
+
+    # Only now are the letter bodies fetched
+    generation_id = query.data.replace("hist_open_", "")
+    generation = await guarded("appwrite", get_generation, user_id, generation_id)
+    if not generation:
+        await context.bot.send_message(chat_id=update.effective_chat.id, text="❌ Cover letters not found.")
+        return
+
+    letters = generation['letters']
+    for i, letter in enumerate(letters, start=1):
+        await context.bot.send_message(
+            chat_id=update.effective_chat.id,
+            text=f"📝 **{generation['tone']} - Variant {i}/{len(letters)}**\n\n{letter}\n\n{'─' * 40}"
+        )
+
+async def _history_page(user_id: str, page: int):
+    """Build the text and keyboard for one page of history (metadata only)"""
+    total, rows = await guarded(
+        "appwrite",
+        list_generations, user_id, HISTORY_PAGE_SIZE, page * HISTORY_PAGE_SIZE
+    )
+    if total == 0:
+        return "ℹ️ No cover letters yet. Send a job description to generate some!", None
+
+    pages = (total + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+    keyboard = [
+        [InlineKeyboardButton(
+            f"📄 {row['$createdAt'][:10]} · {row['tone']} · {row.get('preview', '')[:30]}",
+            callback_data=f"hist_open_{row['$id']}"
+        )]
+        for row in rows
+    ]
+
+    navigation = []
+    if page > 0:
+        navigation.append(InlineKeyboardButton("⬅️ Newer", callback_data=f"hist_page_{page - 1}"))
+    if page + 1 < pages:
+        navigation.append(InlineKeyboardButton("Older ➡️", callback_data=f"hist_page_{page + 1}"))
+    if navigation:
+        keyboard.append(navigation)
+
+    return (
+        f"🗂️ **Your cover letters** (page {page + 1}/{pages})\n\n"
+        "Tap one to see its letters again.",
+        telegram.InlineKeyboardMarkup(keyboard)
+    )
+
+
+# Jobs that survive a restart
+drain.register("upload", process_resume_upload)
+drain.register("generation", deliver_cover_letters)
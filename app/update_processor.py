@@ -0,0 +1,79 @@
+"""
+Update processor that keeps each chat's updates in order while running chats concurrently
+"""
+import asyncio
+import inspect
+import os
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from app.drain import drain
+from app.resilience import deadline_scope
+from app.shared_state import chat_locks
+
+# Upper bound on updates processed at once, across all chats
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "32"))
+# Upper bound on updates accepted at once, including those waiting behind their chat
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES", str(MAX_CONCURRENT_UPDATES * 8)))
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """Process updates concurrently, but one at a time (FIFO) per chat.
+
+    Updates of the same chat wait on that chat's lock so handlers such as
+    handle_text and handle_tone_selection never race on the same session.
+    asyncio locks wake waiters in arrival order, which keeps each chat FIFO.
+
+    A processing slot is only taken once the chat lock is held, so updates
+    queued behind one busy chat never hold slots other chats could use. The
+    base class semaphore only bounds how many updates are accepted at once.
+    """
+
+    def __init__(self, max_concurrent_updates: int, max_pending_updates: int):
+        super().__init__(max(max_concurrent_updates, max_pending_updates))
+        self.max_active_updates = max_concurrent_updates
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._active = 0
+
+    @property
+    def active_updates(self) -> int:
+        """Number of updates currently running a handler"""
+        return self._active
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        chat_id = None
+        if isinstance(update, Update) and update.effective_chat:
+            chat_id = update.effective_chat.id
+
+        started = False
+        try:
+            # The deadline starts once the chat's earlier updates are done
+            async with chat_locks.locked(chat_id), self._slots:
+                # A draining instance persists queued updates instead of starting them
+                if not await drain.begin_update():
+                    return
+                started = True
+                self._active += 1
+                try:
+                    with deadline_scope():
+                        await coroutine
+                finally:
+                    self._active -= 1
+        finally:
+            if not started and inspect.iscoroutine(coroutine):
+                coroutine.close()
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+
+# Singleton instance
+update_processor = ChatOrderedUpdateProcessor(
+    max_concurrent_updates=MAX_CONCURRENT_UPDATES,
+    max_pending_updates=MAX_PENDING_UPDATES,
+)